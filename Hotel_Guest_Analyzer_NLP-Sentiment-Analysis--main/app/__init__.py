@@ -41,9 +41,32 @@ def create_app(config_class=Config):
     from app.routes import bp as routes_bp
     app.register_blueprint(routes_bp)
     
+    # Micro-batch concurrent API analysis requests
+    if app.config.get('ANALYZE_BATCH_WINDOW_MS', 0) > 0:
+        from app.batching import AnalysisBatcher
+        app.extensions['analysis_batcher'] = AnalysisBatcher(app)
+    
     # Create database tables
     with app.app_context():
         db.create_all()
+        upgrade_schema()
+        from app.stats import backfill_user_stats
+        backfill_user_stats()
     
     return app
 
+def upgrade_schema():
+    """Add nullable columns and indexes introduced after a table was first created"""
+    inspector = db.inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            missing = [c for c in table.columns if c.name not in existing and c.nullable]
+            for column in missing:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                conn.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(conn)
+
@@ -0,0 +1,202 @@
+"""
+Request micro-batching for the analysis API
+"""
+import queue
+import threading
+import time
+
+from app import db
+from app.models import Analysis
+from app.sentiment_analyzer import analyze_batch
+from app.stats import SentimentSketch, record_stats
+
+class _PendingAnalysis:
+    """A single caller waiting for its review to be scored and stored"""
+    def __init__(self, user_id, text):
+        self.user_id = user_id
+        self.text = text
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._claimed = False
+        self._cancelled = False
+
+    def claim(self):
+        """Called by the worker before writing; False if the caller gave up"""
+        with self._lock:
+            if self._cancelled:
+                return False
+            self._claimed = True
+            return True
+
+    def cancel(self):
+        """Called by a timed-out caller; False if the row is already being written"""
+        with self._lock:
+            if self._claimed:
+                return False
+            self._cancelled = True
+            return True
+
+class AnalysisBatcher:
+    """
+    Collect concurrent analysis requests and process them together
+
+    Requests are gathered for up to ANALYZE_BATCH_WINDOW_MS after the first
+    one arrives, or until ANALYZE_BATCH_MAX_SIZE are waiting. The batch is
+    scored with analyze_batch and written in a single transaction, then
+    every caller receives its own result. A wider window means bigger
+    batches and fewer commits at the cost of added latency per request.
+
+    A caller that times out before its batch is written is dropped from the
+    batch, so a timeout always means nothing was stored and the request
+    can be retried safely. A failed write is retried once.
+    """
+    def __init__(self, app):
+        self.app = app
+        self.window = app.config['ANALYZE_BATCH_WINDOW_MS'] / 1000.0
+        self.max_size = app.config['ANALYZE_BATCH_MAX_SIZE']
+        self.timeout = app.config['ANALYZE_BATCH_TIMEOUT']
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'requests': 0,
+            'batches': 0,
+            'errors': 0,
+            'retries': 0,
+            'cancelled': 0,
+            'max_batch_size': 0,
+            'total_wait_ms': 0.0,
+            'total_flush_ms': 0.0
+        }
+
+    def submit(self, user_id, text):
+        """
+        Queue a review and block until its batch has been stored
+
+        Args:
+            user_id (int): Owner of the analysis
+            text (str): Review text
+
+        Returns:
+            dict: Sentiment, polarity and subjectivity for the review
+        """
+        self._ensure_worker()
+        # Return this request's connection to the pool while waiting, otherwise
+        # blocked callers can starve the worker of connections
+        db.session.close()
+        pending = _PendingAnalysis(user_id, text)
+        self._queue.put(pending)
+        if not pending.done.wait(self.timeout):
+            if pending.cancel():
+                with self._metrics_lock:
+                    self._metrics['cancelled'] += 1
+                raise TimeoutError('Timed out waiting for analysis batch')
+            # Already being written; the result is moments away
+            pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def metrics(self):
+        """Snapshot of batching counters and averages"""
+        with self._metrics_lock:
+            snapshot = dict(self._metrics)
+        batches = snapshot['batches']
+        requests = snapshot['requests']
+        snapshot['avg_batch_size'] = round(requests / batches, 2) if batches else 0
+        snapshot['avg_wait_ms'] = round(snapshot.pop('total_wait_ms') / requests, 3) if requests else 0
+        snapshot['avg_flush_ms'] = round(snapshot.pop('total_flush_ms') / batches, 3) if batches else 0
+        snapshot['queue_depth'] = self._queue.qsize()
+        snapshot['window_ms'] = self.window * 1000
+        snapshot['max_size'] = self.max_size
+        return snapshot
+
+    def _ensure_worker(self):
+        """Start the background worker on first use"""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='analysis-batcher', daemon=True)
+                self._worker.start()
+
+    def _collect(self):
+        """Block for the first request, then gather more until the window closes"""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        """Worker loop: collect, score and store batches forever"""
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                self._flush(batch)
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+                with self._metrics_lock:
+                    self._metrics['errors'] += 1
+            finished = time.perf_counter()
+
+            with self._metrics_lock:
+                self._metrics['requests'] += len(batch)
+                self._metrics['batches'] += 1
+                self._metrics['max_batch_size'] = max(self._metrics['max_batch_size'], len(batch))
+                self._metrics['total_wait_ms'] += sum((started - p.enqueued_at) * 1000 for p in batch)
+                self._metrics['total_flush_ms'] += (finished - started) * 1000
+
+            for pending in batch:
+                pending.done.set()
+
+    def _flush(self, batch):
+        """Score a batch and write all of its rows in one transaction, retrying once"""
+        results = analyze_batch([pending.text for pending in batch])
+        claimed = [(pending, result) for pending, result in zip(batch, results) if pending.claim()]
+        if not claimed:
+            return
+        try:
+            self._write(claimed)
+        except Exception:
+            with self._metrics_lock:
+                self._metrics['retries'] += 1
+            self._write(claimed)
+        for pending, result in claimed:
+            result.pop('review', None)
+            pending.result = result
+
+    def _write(self, claimed):
+        """Insert analyses and update statistics in a single transaction"""
+        with self.app.app_context():
+            try:
+                db.session.bulk_insert_mappings(Analysis, [
+                    {
+                        'user_id': pending.user_id,
+                        'review_text': pending.text,
+                        'sentiment': result['sentiment'],
+                        'polarity': result['polarity']
+                    }
+                    for pending, result in claimed
+                ])
+                sketches = {}
+                for pending, result in claimed:
+                    sketches.setdefault(pending.user_id, SentimentSketch()).update(result)
+                for user_id, sketch in sketches.items():
+                    record_stats('user', user_id, sketch)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
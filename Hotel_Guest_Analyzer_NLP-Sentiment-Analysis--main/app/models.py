@@ -30,16 +30,109 @@ class User(UserMixin, db.Model):
 
 class Analysis(db.Model):
     """Analysis history model"""
+    # Supports the retention job's per-user age scans
+    __table_args__ = (db.Index('ix_analysis_user_id_created_at', 'user_id', 'created_at'),)
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     review_text = db.Column(db.Text, nullable=False)
     sentiment = db.Column(db.String(20), nullable=False)
     polarity = db.Column(db.Float, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    batch_id = db.Column(db.Integer, db.ForeignKey('upload_batch.id'), nullable=True, index=True)
     
     def __repr__(self):
         return f'<Analysis {self.id} - {self.sentiment}>'
 
+class UploadBatch(db.Model):
+    """Review file uploaded for bulk analysis"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(20), default='processing')
+    total_rows = db.Column(db.Integer, default=0)
+    analyzed = db.Column(db.Integer, default=0)
+    positive = db.Column(db.Integer, default=0)
+    negative = db.Column(db.Integer, default=0)
+    neutral = db.Column(db.Integer, default=0)
+    polarity_sum = db.Column(db.Float, default=0.0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Analyses created from this upload
+    analyses = db.relationship('Analysis', backref='batch', lazy='dynamic')
+    
+    def summary(self):
+        """Aggregate results of the upload"""
+        return {
+            'batch_id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'total_rows': self.total_rows,
+            'analyzed': self.analyzed,
+            'distribution': {
+                'positive': self.positive,
+                'negative': self.negative,
+                'neutral': self.neutral
+            },
+            'avg_polarity': round(self.polarity_sum / self.analyzed, 3) if self.analyzed else 0
+        }
+    
+    def __repr__(self):
+        return f'<UploadBatch {self.id} - {self.filename}>'
+
+class SentimentStats(db.Model):
+    """Serialized polarity/subjectivity sketch for a user or dataset"""
+    __table_args__ = (db.UniqueConstraint('scope', 'scope_key'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(20), nullable=False)
+    scope_key = db.Column(db.String(255), nullable=False)
+    sketch = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SentimentStats {self.scope}:{self.scope_key}>'
+
+class RetentionPolicy(db.Model):
+    """Maximum age of live analyses for one user, or for everyone when user_id is empty"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, unique=True)
+    max_age_days = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<RetentionPolicy {self.user_id or "global"} - {self.max_age_days} days>'
+
+class AnalysisArchive(db.Model):
+    """Analysis rows moved out of the live table by the retention job"""
+    id = db.Column(db.Integer, primary_key=True)
+    # Original Analysis.id; SQLite reuses ids of deleted rows, so this is only
+    # unique together with archived_at
+    analysis_id = db.Column(db.Integer, nullable=True, index=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    review_text = db.Column(db.Text, nullable=False)
+    sentiment = db.Column(db.String(20), nullable=False)
+    polarity = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime)
+    batch_id = db.Column(db.Integer, nullable=True)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<AnalysisArchive {self.id} - {self.sentiment}>'
+
+class ArchivedCounts(db.Model):
+    """Per-user totals of archived analyses, so dashboard counts stay complete"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total = db.Column(db.Integer, default=0)
+    positive = db.Column(db.Integer, default=0)
+    negative = db.Column(db.Integer, default=0)
+    neutral = db.Column(db.Integer, default=0)
+    polarity_sum = db.Column(db.Float, default=0.0)
+    last_archived_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<ArchivedCounts {self.user_id} - {self.total}>'
+
 
 
 
@@ -0,0 +1,79 @@
+"""
+Streaming review readers for CSV, NDJSON and plain-text sources
+"""
+import csv
+import json
+import os
+
+# Column holding the review text in data/hotel_reviews_dataset.csv
+DEFAULT_TEXT_COLUMN = 'Cleaned Text (Lowercased)'
+
+FORMAT_EXTENSIONS = {
+    '.csv': 'csv',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.txt': 'txt'
+}
+
+def detect_format(filename):
+    """
+    Guess the input format from a file name
+
+    Args:
+        filename (str): Path or upload file name
+
+    Returns:
+        str: One of 'csv', 'ndjson' or 'txt'
+    """
+    ext = os.path.splitext(filename or '')[1].lower()
+    if ext not in FORMAT_EXTENSIONS:
+        raise ValueError(f'Unsupported file type: {ext or filename}')
+    return FORMAT_EXTENSIONS[ext]
+
+def iter_reviews(stream, fmt, column=DEFAULT_TEXT_COLUMN):
+    """
+    Lazily yield reviews from a text stream, one record at a time
+
+    Args:
+        stream: Text file object (opened with newline='' for CSV)
+        fmt (str): 'csv', 'ndjson' or 'txt'
+        column (str): Field holding the review text (CSV and NDJSON only)
+
+    Yields:
+        tuple: (row_number, text) where row_number is the 1-based record
+        position in the source; blank reviews are skipped but still counted
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        if reader.fieldnames is None:
+            return
+        if column not in reader.fieldnames:
+            raise ValueError(f"Column '{column}' not found. Available columns: "
+                             f"{', '.join(reader.fieldnames)}")
+        records = (row.get(column) or '' for row in reader)
+    elif fmt == 'ndjson':
+        records = _iter_ndjson(stream, column)
+    elif fmt == 'txt':
+        records = (line.rstrip('\r\n') for line in stream)
+    else:
+        raise ValueError(f'Unsupported format: {fmt}')
+
+    for row_number, text in enumerate(records, start=1):
+        text = str(text).strip()
+        if text:
+            yield row_number, text
+
+def _iter_ndjson(stream, column):
+    """Yield the text field of each NDJSON line (blank lines are records too)"""
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            yield ''
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f'Invalid JSON on line {line_number}: {e}')
+        if isinstance(record, dict):
+            yield record.get(column) or ''
+        else:
+            yield record if isinstance(record, str) else ''
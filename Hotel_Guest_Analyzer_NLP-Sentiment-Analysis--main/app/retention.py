@@ -0,0 +1,261 @@
+"""
+Retention, archival and compaction for the Analysis table
+"""
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from flask import current_app
+from app import db
+from app.models import User, Analysis, AnalysisArchive, ArchivedCounts, RetentionPolicy
+
+ARCHIVE_TARGETS = ('file', 'table')
+
+# Rough per-row storage besides the review text (ids, numbers, timestamp, index entries)
+ROW_OVERHEAD_BYTES = 64
+
+def set_policy(max_age_days, user_id=None):
+    """Create or update the global policy, or the policy of one user (caller commits)"""
+    policy = RetentionPolicy.query.filter_by(user_id=user_id).first()
+    if policy is None:
+        policy = RetentionPolicy(user_id=user_id, max_age_days=max_age_days)
+        db.session.add(policy)
+    policy.max_age_days = max_age_days
+    return policy
+
+def clear_policy(user_id=None):
+    """Remove the global policy, or the policy of one user (caller commits)"""
+    return RetentionPolicy.query.filter_by(user_id=user_id).delete()
+
+def effective_policies(user_id=None, max_age_days=None):
+    """
+    Resolve the retention period for each user
+
+    A user's own policy wins over the global policy, which wins over the
+    RETENTION_DAYS setting. max_age_days overrides all of them.
+
+    Args:
+        user_id (int): Restrict to one user
+        max_age_days (int): Override for every selected user
+
+    Returns:
+        list: (User, days) pairs for users subject to retention
+    """
+    policies = {policy.user_id: policy.max_age_days for policy in RetentionPolicy.query.all()}
+    default = policies.get(None, current_app.config.get('RETENTION_DAYS'))
+
+    users = User.query.order_by(User.id)
+    if user_id is not None:
+        users = users.filter_by(id=user_id)
+
+    resolved = []
+    for user in users:
+        days = max_age_days if max_age_days is not None else policies.get(user.id, default)
+        if days is not None:
+            resolved.append((user, days))
+    return resolved
+
+def plan_retention(user_id=None, max_age_days=None, now=None):
+    """
+    Count the rows each policy would archive, without changing anything
+
+    Returns:
+        list: One dict per user with cutoff, rows and estimated bytes
+    """
+    if max_age_days is not None and max_age_days < 0:
+        raise ValueError('Retention period must not be negative')
+    now = now or datetime.utcnow()
+    plan = []
+    for user, days in effective_policies(user_id, max_age_days):
+        cutoff = now - timedelta(days=days)
+        rows, text_bytes = db.session.query(
+            db.func.count(Analysis.id),
+            db.func.coalesce(db.func.sum(db.func.length(Analysis.review_text)), 0)
+        ).filter(Analysis.user_id == user.id, Analysis.created_at < cutoff).one()
+        plan.append({
+            'user_id': user.id,
+            'username': user.username,
+            'max_age_days': days,
+            'cutoff': cutoff,
+            'rows': rows,
+            'estimated_bytes': int(text_bytes) + rows * ROW_OVERHEAD_BYTES
+        })
+    return plan
+
+def archive_user(user_id, cutoff, target='file', batch_size=None, archive_dir=None, pause=0):
+    """
+    Move a user's analyses older than cutoff out of the live table
+
+    Rows are moved in batches, each in its own short transaction, so the
+    web app is never locked out for long. Archived counts are rolled into
+    ArchivedCounts in the same transaction as the delete. With the file
+    target each batch is written and synced before its rows are deleted;
+    a crash in between can archive a batch twice but never loses it.
+
+    Args:
+        user_id (int): Owner of the analyses
+        cutoff (datetime): Rows created before this are archived
+        target (str): 'file' (gzipped NDJSON) or 'table' (AnalysisArchive)
+        batch_size (int): Rows per transaction
+        archive_dir (Path): Directory for archive files
+        pause (float): Seconds to sleep between batches
+
+    Returns:
+        tuple: (rows archived, archive file path or None)
+    """
+    if target not in ARCHIVE_TARGETS:
+        raise ValueError(f'Unknown archive target: {target}')
+    batch_size = batch_size or current_app.config['RETENTION_BATCH_SIZE']
+    if batch_size < 1:
+        # A negative LIMIT means no limit in SQLite, i.e. one long transaction
+        raise ValueError('Batch size must be at least 1')
+
+    path = None
+    if target == 'file':
+        archive_dir = Path(archive_dir or current_app.config['ARCHIVE_DIR'])
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        path = archive_dir / f"analysis-user{user_id}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.ndjson.gz"
+
+    archived = 0
+    while True:
+        rows = Analysis.query.filter(Analysis.user_id == user_id, Analysis.created_at < cutoff)\
+            .order_by(Analysis.id)\
+            .limit(batch_size)\
+            .all()
+        if not rows:
+            break
+
+        try:
+            archived_at = datetime.utcnow()
+            if target == 'file':
+                _append_archive_file(path, rows, archived_at)
+            else:
+                db.session.bulk_insert_mappings(AnalysisArchive, [_row_to_dict(row, archived_at) for row in rows])
+
+            counts = ArchivedCounts.query.filter_by(user_id=user_id).first()
+            if counts is None:
+                counts = ArchivedCounts(user_id=user_id, total=0, positive=0, negative=0,
+                                        neutral=0, polarity_sum=0.0)
+                db.session.add(counts)
+            for row in rows:
+                counts.total += 1
+                setattr(counts, row.sentiment, getattr(counts, row.sentiment) + 1)
+                counts.polarity_sum += row.polarity
+            counts.last_archived_at = archived_at
+
+            Analysis.query.filter(Analysis.id.in_([row.id for row in rows]))\
+                .delete(synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        archived += len(rows)
+        db.session.expunge_all()
+        if pause:
+            time.sleep(pause)
+
+    return archived, (path if archived else None)
+
+def run_retention(user_id=None, max_age_days=None, target='file', batch_size=None,
+                  archive_dir=None, pause=0, now=None):
+    """
+    Apply retention policies to every selected user
+
+    Returns:
+        list: The plan entries with an 'archived' count and 'archive' path added
+    """
+    plan = plan_retention(user_id, max_age_days, now)
+    for entry in plan:
+        if entry['rows'] == 0:
+            entry['archived'], entry['archive'] = 0, None
+            continue
+        entry['archived'], entry['archive'] = archive_user(
+            entry['user_id'], entry['cutoff'], target, batch_size, archive_dir, pause)
+    return plan
+
+def sqlite_space():
+    """
+    Page usage of the SQLite database
+
+    Returns:
+        dict: page_size, page_count, freelist_count, auto_vacuum mode and
+        total/free bytes, or None for other databases
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return None
+    with db.engine.connect() as conn:
+        space = {name: conn.exec_driver_sql(f'PRAGMA {name}').scalar()
+                 for name in ('page_size', 'page_count', 'freelist_count', 'auto_vacuum')}
+    space['total_bytes'] = space['page_size'] * space['page_count']
+    space['free_bytes'] = space['page_size'] * space['freelist_count']
+    return space
+
+def incremental_vacuum(pages=None, enable=False):
+    """
+    Return free pages to the filesystem with PRAGMA incremental_vacuum
+
+    Incremental vacuum only works once auto_vacuum is INCREMENTAL. Switching
+    an existing database over needs one full VACUUM, which locks the whole
+    file, so it only happens when enable is True.
+
+    Args:
+        pages (int): Maximum pages to free (default: all free pages)
+        enable (bool): Switch auto_vacuum to INCREMENTAL if needed
+
+    Returns:
+        dict: Space before/after and bytes reclaimed, or None if not SQLite
+    """
+    before = sqlite_space()
+    if before is None:
+        return None
+
+    conn = db.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+    try:
+        if before['auto_vacuum'] != 2:
+            if not enable:
+                return {'enabled': False, 'before': before, 'after': before, 'reclaimed_bytes': 0}
+            conn.exec_driver_sql('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.exec_driver_sql('VACUUM')
+        pragma = f'PRAGMA incremental_vacuum({int(pages)})' if pages else 'PRAGMA incremental_vacuum'
+        # SQLite frees one page per step; executescript steps the pragma to completion
+        conn.connection.dbapi_connection.executescript(pragma)
+    finally:
+        conn.close()
+
+    after = sqlite_space()
+    return {
+        'enabled': True,
+        'before': before,
+        'after': after,
+        # Enabling adds pointer-map pages, so the file can grow slightly
+        'reclaimed_bytes': max(0, before['total_bytes'] - after['total_bytes'])
+    }
+
+def _row_to_dict(row, archived_at):
+    """Archive record for a live row; analysis_id plus archived_at identify it"""
+    return {
+        'analysis_id': row.id,
+        'user_id': row.user_id,
+        'review_text': row.review_text,
+        'sentiment': row.sentiment,
+        'polarity': row.polarity,
+        'created_at': row.created_at,
+        'batch_id': row.batch_id,
+        'archived_at': archived_at
+    }
+
+def _append_archive_file(path, rows, archived_at):
+    """Append rows to a gzipped NDJSON file and sync it to disk"""
+    with open(path, 'ab') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='ab') as archive:
+            for row in rows:
+                record = _row_to_dict(row, archived_at)
+                record['created_at'] = row.created_at.isoformat() if row.created_at else None
+                record['archived_at'] = archived_at.isoformat()
+                archive.write((json.dumps(record) + '\n').encode('utf-8'))
+        raw.flush()
+        os.fsync(raw.fileno())
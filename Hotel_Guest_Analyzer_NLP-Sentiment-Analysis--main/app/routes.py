@@ -1,12 +1,15 @@
 """
 Application routes
 """
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session, current_app
 from flask_login import login_user, logout_user, login_required, current_user
 from app import db
-from app.models import User, Analysis
+from app.models import User, Analysis, UploadBatch, ArchivedCounts
 from app.auth import create_user, get_user_by_username
 from app.sentiment_analyzer import analyze_sentiment, analyze_batch, get_sentiment_distribution
+from app.readers import DEFAULT_TEXT_COLUMN
+from app.uploads import analyze_upload
+from app.stats import SentimentSketch, get_stats, get_user_stats, record_analyses, record_stats
 from werkzeug.security import check_password_hash
 import json
 import pandas as pd
@@ -15,6 +18,9 @@ from collections import Counter
 
 bp = Blueprint('routes', __name__)
 
+# Bundled real-world dataset, also the key of its stored statistics
+DATASET_FILENAME = 'hotel_reviews_dataset.csv'
+
 @bp.route('/')
 def index():
     """Home page"""
@@ -113,9 +119,19 @@ def dashboard():
         'neutral': neutral_count
     }
     
+    # Include analyses moved out by the retention job
+    archived = ArchivedCounts.query.filter_by(user_id=current_user.id).first()
+    if archived:
+        for key in stats:
+            stats[key] += getattr(archived, key)
+    
+    # Polarity distribution from the stored sketch, without loading rows
+    polarity_stats = get_user_stats(current_user.id).summary()['polarity']
+    
     return render_template('dashboard.html', 
                          recent_analyses=recent_analyses,
-                         stats=stats)
+                         stats=stats,
+                         polarity_stats=polarity_stats)
 
 @bp.route('/analyze', methods=['GET', 'POST'])
 @login_required
@@ -139,6 +155,7 @@ def analyze():
                     polarity=result['polarity']
                 )
                 db.session.add(analysis)
+            record_analyses(current_user.id, results)
             db.session.commit()
             
             # Calculate distribution
@@ -162,6 +179,7 @@ def analyze():
                 polarity=result['polarity']
             )
             db.session.add(analysis)
+            record_analyses(current_user.id, [result])
             db.session.commit()
             
             # Create complete distribution dictionary
@@ -185,7 +203,7 @@ def analyze():
 @login_required
 def analyze_dataset():
     """Analyze the real-world hotel reviews dataset"""
-    dataset_path = os.path.join('data', 'hotel_reviews_dataset.csv')
+    dataset_path = os.path.join('data', DATASET_FILENAME)
     
     if not os.path.exists(dataset_path):
         flash('Dataset file not found', 'error')
@@ -234,8 +252,9 @@ def analyze_dataset():
         top_aspects = dict(aspect_counts.most_common(10))
         
         # Polarity statistics
-        polarities = [r['polarity'] for r in results]
-        avg_polarity = sum(polarities) / len(polarities) if polarities else 0
+        dataset_sketch = SentimentSketch().update_many(results)
+        dataset_stats = dataset_sketch.summary()
+        avg_polarity = dataset_stats['polarity']['mean']
         
         # Save sample to database
         for result in results[:10]:  # Save first 10 to database
@@ -246,6 +265,9 @@ def analyze_dataset():
                 polarity=result['polarity']
             )
             db.session.add(analysis)
+        record_analyses(current_user.id, results[:10])
+        # The dataset is recomputed on every visit, so its statistics are replaced
+        record_stats('dataset', DATASET_FILENAME, dataset_sketch, replace=True)
         db.session.commit()
         
         return render_template('dataset_analysis.html',
@@ -254,7 +276,8 @@ def analyze_dataset():
                              accuracy=round(accuracy, 2),
                              total_reviews=len(results),
                              top_aspects=top_aspects,
-                             avg_polarity=round(avg_polarity, 3))
+                             avg_polarity=round(avg_polarity, 3),
+                             polarity_percentiles=dataset_stats['polarity']['percentiles'])
     
     except Exception as e:
         flash(f'Error analyzing dataset: {str(e)}', 'error')
@@ -270,6 +293,17 @@ def api_analyze():
     if not review_text:
         return jsonify({'error': 'No text provided'}), 400
     
+    batcher = current_app.extensions.get('analysis_batcher')
+    if batcher is not None:
+        # Scored and saved together with other concurrent requests
+        try:
+            result = batcher.submit(current_user.id, review_text)
+        except TimeoutError as e:
+            return jsonify({'error': str(e)}), 503
+        except Exception:
+            return jsonify({'error': 'Analysis could not be saved, please retry'}), 503
+        return jsonify(result)
+    
     result = analyze_sentiment(review_text)
     
     # Save to database
@@ -280,7 +314,85 @@ def api_analyze():
         polarity=result['polarity']
     )
     db.session.add(analysis)
+    record_analyses(current_user.id, [result])
     db.session.commit()
     
     return jsonify(result)
 
+@bp.route('/api/analyze/metrics', methods=['GET'])
+@login_required
+def api_analyze_metrics():
+    """Micro-batching metrics for the analysis API"""
+    batcher = current_app.extensions.get('analysis_batcher')
+    if batcher is None:
+        return jsonify({'enabled': False})
+    metrics = batcher.metrics()
+    metrics['enabled'] = True
+    return jsonify(metrics)
+
+@bp.route('/api/stats', methods=['GET'])
+@login_required
+def api_stats():
+    """Polarity and subjectivity statistics for the current user"""
+    bins = max(1, min(request.args.get('bins', 20, type=int), 100))
+    return jsonify(get_user_stats(current_user.id).summary(bins=bins))
+
+@bp.route('/api/stats/dataset', methods=['GET'])
+@login_required
+def api_dataset_stats():
+    """Polarity and subjectivity statistics from the last real dataset analysis"""
+    bins = max(1, min(request.args.get('bins', 20, type=int), 100))
+    return jsonify(get_stats('dataset', DATASET_FILENAME).summary(bins=bins))
+
+@bp.route('/api/upload', methods=['POST'])
+@login_required
+def api_upload():
+    """API endpoint for analyzing an uploaded CSV/TXT file"""
+    column = request.form.get('column', '').strip() or DEFAULT_TEXT_COLUMN
+    batch, error = analyze_upload(request.files.get('review_file'), current_user.id, column)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    summary = batch.summary()
+    summary['results_url'] = url_for('routes.api_upload_results', batch_id=batch.id)
+    return jsonify(summary), 201
+
+@bp.route('/api/upload/<int:batch_id>/stats', methods=['GET'])
+@login_required
+def api_upload_stats(batch_id):
+    """Polarity and subjectivity statistics for an uploaded file"""
+    batch = UploadBatch.query.filter_by(id=batch_id, user_id=current_user.id).first()
+    if batch is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    
+    bins = max(1, min(request.args.get('bins', 20, type=int), 100))
+    return jsonify(get_stats('dataset', f'upload:{batch.id}').summary(bins=bins))
+
+@bp.route('/api/upload/<int:batch_id>', methods=['GET'])
+@login_required
+def api_upload_results(batch_id):
+    """Paged results of an uploaded file"""
+    batch = UploadBatch.query.filter_by(id=batch_id, user_id=current_user.id).first()
+    if batch is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', current_app.config['UPLOAD_PAGE_SIZE'], type=int)
+    per_page = max(1, min(per_page, 500))
+    pagination = batch.analyses.order_by(Analysis.id).paginate(page=page, per_page=per_page, error_out=False)
+    
+    return jsonify({
+        'summary': batch.summary(),
+        'page': pagination.page,
+        'pages': pagination.pages,
+        'per_page': per_page,
+        'results': [
+            {
+                'id': analysis.id,
+                'review': analysis.review_text,
+                'sentiment': analysis.sentiment,
+                'polarity': analysis.polarity
+            }
+            for analysis in pagination.items
+        ]
+    })
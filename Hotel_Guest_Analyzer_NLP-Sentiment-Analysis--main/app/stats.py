@@ -0,0 +1,366 @@
+"""
+Streaming polarity and subjectivity statistics
+
+Keeps mergeable summaries (count/mean/variance and a KLL quantile sketch)
+so percentiles and histograms can be served without loading raw rows, and
+partial results from chunks or worker processes can be combined.
+"""
+import json
+import math
+import random
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import Analysis, SentimentStats, UploadBatch
+
+# Value ranges used for histograms
+METRIC_RANGES = {
+    'polarity': (-1.0, 1.0),
+    'subjectivity': (0.0, 1.0)
+}
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+class RunningStats:
+    """Count, mean, variance, min and max (Welford / Chan et al. merge)"""
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def update(self, value):
+        """Add a single value"""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        """Combine with another RunningStats in place"""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self):
+        """Population variance"""
+        return self.m2 / self.count if self.count else 0.0
+
+    def to_dict(self):
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2, 'min': self.min, 'max': self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.count = data['count']
+        stats.mean = data['mean']
+        stats.m2 = data['m2']
+        stats.min = data['min']
+        stats.max = data['max']
+        return stats
+
+class KLLSketch:
+    """
+    KLL quantile sketch (Karnin, Lang & Liberty, 2016)
+
+    Items are kept in levels of compactors; an item at level h stands for
+    2**h original values. When a level overflows, it is sorted and every
+    other item is promoted, so memory stays around 3k items no matter how
+    many values are added. Sketches with the same k can be merged.
+    """
+    def __init__(self, k=200):
+        self.k = k
+        self.compactors = [[]]
+        self.size = 0
+        self.n = 0
+
+    def _capacity(self, level):
+        depth = len(self.compactors) - level - 1
+        return int(math.ceil(self.k * (2 / 3) ** depth)) + 1
+
+    def _max_size(self):
+        return sum(self._capacity(level) for level in range(len(self.compactors)))
+
+    def update(self, value):
+        """Add a single value (amortised O(1))"""
+        self.compactors[0].append(value)
+        self.size += 1
+        self.n += 1
+        if self.size >= self._max_size():
+            self._compress()
+
+    def merge(self, other):
+        """Combine with another sketch in place"""
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for level, items in enumerate(other.compactors):
+            self.compactors[level].extend(items)
+        self.size = sum(len(items) for items in self.compactors)
+        self.n += other.n
+        while self.size >= self._max_size():
+            self._compress()
+        return self
+
+    def _compress(self):
+        for level in range(len(self.compactors)):
+            items = self.compactors[level]
+            if len(items) >= self._capacity(level):
+                if level + 1 >= len(self.compactors):
+                    self.compactors.append([])
+                items.sort()
+                # Compact an even number of items so total weight is preserved
+                leftover = items.pop() if len(items) % 2 else None
+                offset = random.randint(0, 1)
+                self.compactors[level + 1].extend(items[offset::2])
+                self.compactors[level] = [leftover] if leftover is not None else []
+                self.size = sum(len(level_items) for level_items in self.compactors)
+                if self.size < self._max_size():
+                    break
+
+    def _weighted_items(self):
+        """Sorted (value, weight) pairs"""
+        weighted = [(value, 2 ** level) for level, items in enumerate(self.compactors) for value in items]
+        weighted.sort()
+        return weighted
+
+    def quantile(self, q):
+        """Approximate value at quantile q (0..1), or None if empty"""
+        if self.n == 0:
+            return None
+        target = q * self.n
+        cumulative = 0
+        weighted = self._weighted_items()
+        for value, weight in weighted:
+            cumulative += weight
+            if cumulative >= target:
+                return value
+        return weighted[-1][0]
+
+    def histogram(self, low, high, bins):
+        """Approximate counts of values in equal-width bins over [low, high]"""
+        counts = [0] * bins
+        width = (high - low) / bins
+        for level, items in enumerate(self.compactors):
+            for value in items:
+                index = min(max(int((value - low) / width), 0), bins - 1)
+                counts[index] += 2 ** level
+        return counts
+
+    def to_dict(self):
+        return {'k': self.k, 'n': self.n, 'compactors': self.compactors}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(k=data['k'])
+        sketch.compactors = [list(items) for items in data['compactors']] or [[]]
+        sketch.size = sum(len(items) for items in sketch.compactors)
+        sketch.n = data['n']
+        return sketch
+
+class SentimentSketch:
+    """Mergeable summary of polarity, subjectivity and sentiment labels"""
+    def __init__(self):
+        self.moments = {metric: RunningStats() for metric in METRIC_RANGES}
+        self.quantiles = {metric: KLLSketch() for metric in METRIC_RANGES}
+        self.labels = {'positive': 0, 'negative': 0, 'neutral': 0}
+
+    @property
+    def count(self):
+        return self.moments['polarity'].count
+
+    def update(self, result):
+        """
+        Add one analysis result
+
+        Args:
+            result (dict): Output of analyze_sentiment; subjectivity is optional
+        """
+        for metric in METRIC_RANGES:
+            if result.get(metric) is not None:
+                self.moments[metric].update(result[metric])
+                self.quantiles[metric].update(result[metric])
+        sentiment = result.get('sentiment')
+        if sentiment:
+            self.labels[sentiment] = self.labels.get(sentiment, 0) + 1
+        return self
+
+    def update_many(self, results):
+        """Add several analysis results"""
+        for result in results:
+            self.update(result)
+        return self
+
+    def merge(self, other):
+        """Combine with another SentimentSketch in place"""
+        for metric in METRIC_RANGES:
+            self.moments[metric].merge(other.moments[metric])
+            self.quantiles[metric].merge(other.quantiles[metric])
+        for sentiment, count in other.labels.items():
+            self.labels[sentiment] = self.labels.get(sentiment, 0) + count
+        return self
+
+    def summary(self, percentiles=DEFAULT_PERCENTILES, bins=20):
+        """
+        Summary statistics for display or JSON responses
+
+        Returns:
+            dict: Per-metric count, mean, std, min, max, percentiles and
+            histogram, plus sentiment label counts
+        """
+        summary = {'count': self.count, 'distribution': dict(self.labels)}
+        for metric, (low, high) in METRIC_RANGES.items():
+            moments = self.moments[metric]
+            sketch = self.quantiles[metric]
+            summary[metric] = {
+                'count': moments.count,
+                'mean': round(moments.mean, 3),
+                'std': round(math.sqrt(moments.variance), 3),
+                'min': moments.min,
+                'max': moments.max,
+                'percentiles': {f'p{p}': sketch.quantile(p / 100) for p in percentiles},
+                'histogram': {
+                    'edges': [round(low + i * (high - low) / bins, 3) for i in range(bins + 1)],
+                    'counts': sketch.histogram(low, high, bins)
+                }
+            }
+        return summary
+
+    def to_dict(self):
+        return {
+            'moments': {metric: stats.to_dict() for metric, stats in self.moments.items()},
+            'quantiles': {metric: sketch.to_dict() for metric, sketch in self.quantiles.items()},
+            'labels': self.labels
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls()
+        for metric in METRIC_RANGES:
+            if metric in data['moments']:
+                sketch.moments[metric] = RunningStats.from_dict(data['moments'][metric])
+                sketch.quantiles[metric] = KLLSketch.from_dict(data['quantiles'][metric])
+        sketch.labels.update(data.get('labels', {}))
+        return sketch
+
+def _get_row(scope, key):
+    """Load or create the stored statistics row for a scope"""
+    row = SentimentStats.query.filter_by(scope=scope, scope_key=str(key)).first()
+    if row is None:
+        row = SentimentStats(scope=scope, scope_key=str(key), sketch=json.dumps(SentimentSketch().to_dict()))
+        db.session.add(row)
+    return row
+
+def get_stats(scope, key):
+    """
+    Load stored statistics
+
+    Args:
+        scope (str): 'user' or 'dataset'
+        key: User id or dataset name
+
+    Returns:
+        SentimentSketch: Stored sketch, empty if nothing was recorded yet
+    """
+    row = SentimentStats.query.filter_by(scope=scope, scope_key=str(key)).first()
+    if row is None:
+        return SentimentSketch()
+    return SentimentSketch.from_dict(json.loads(row.sketch))
+
+def get_user_stats(user_id):
+    """
+    Load a user's statistics, including uploads that are still in progress
+
+    An upload's sketch is only folded into the user scope when it finishes,
+    so sketches of batches still 'processing' (or interrupted by a crash)
+    are merged in here to match the rows already committed.
+
+    Args:
+        user_id (int): Owner of the analyses
+
+    Returns:
+        SentimentSketch: Combined sketch
+    """
+    sketch = get_stats('user', user_id)
+    keys = [f'upload:{batch_id}' for (batch_id,) in db.session.query(UploadBatch.id)
+            .filter_by(user_id=user_id, status='processing')]
+    if keys:
+        rows = SentimentStats.query.filter(SentimentStats.scope == 'dataset',
+                                           SentimentStats.scope_key.in_(keys))
+        for row in rows:
+            sketch.merge(SentimentSketch.from_dict(json.loads(row.sketch)))
+    return sketch
+
+def record_stats(scope, key, sketch, replace=False):
+    """
+    Merge a partial sketch into stored statistics
+
+    The change is added to the current session; the caller commits it in
+    the same transaction as the analyses it describes.
+
+    Args:
+        scope (str): 'user' or 'dataset'
+        key: User id or dataset name
+        sketch (SentimentSketch): Partial statistics to merge
+        replace (bool): Overwrite instead of merging (for recomputed datasets)
+    """
+    row = _get_row(scope, key)
+    if not replace and row.sketch:
+        sketch = SentimentSketch.from_dict(json.loads(row.sketch)).merge(sketch)
+    row.sketch = json.dumps(sketch.to_dict())
+    row.updated_at = datetime.utcnow()
+
+def record_analyses(user_id, results):
+    """Add analysis results to a user's statistics (caller commits)"""
+    if results:
+        record_stats('user', user_id, SentimentSketch().update_many(results))
+
+def backfill_user_stats():
+    """
+    Build sketches for users whose analyses predate statistics tracking
+
+    Runs at startup, before any request can add analyses, by streaming each
+    such user's stored rows. Analysis does not store subjectivity, so a
+    backfilled sketch covers polarity and sentiment labels for all rows but
+    subjectivity only for analyses made afterwards. Rows of uploads still
+    'processing' are skipped because get_user_stats adds their own sketch.
+    """
+    existing = {key for (key,) in db.session.query(SentimentStats.scope_key).filter_by(scope='user')}
+    user_ids = [user_id for (user_id,) in db.session.query(Analysis.user_id).distinct()
+                if str(user_id) not in existing]
+    if not user_ids:
+        return
+    unfinished = db.select(UploadBatch.id).where(UploadBatch.status == 'processing')
+    try:
+        for user_id in user_ids:
+            sketch = SentimentSketch()
+            rows = db.session.query(Analysis.polarity, Analysis.sentiment)\
+                .filter(Analysis.user_id == user_id)\
+                .filter(db.or_(Analysis.batch_id.is_(None), Analysis.batch_id.notin_(unfinished)))\
+                .yield_per(1000)
+            for polarity, sentiment in rows:
+                sketch.update({'polarity': polarity, 'sentiment': sentiment})
+            record_stats('user', user_id, sketch, replace=True)
+        db.session.commit()
+    except IntegrityError:
+        # Another process starting at the same time backfilled first
+        db.session.rollback()
+    except Exception:
+        db.session.rollback()
+        raise
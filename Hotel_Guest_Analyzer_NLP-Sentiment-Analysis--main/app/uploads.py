@@ -0,0 +1,125 @@
+"""
+Streaming analysis of uploaded review files
+"""
+import io
+from itertools import islice
+
+from flask import current_app
+from app import db
+from app.models import Analysis, SentimentStats, UploadBatch
+from app.readers import DEFAULT_TEXT_COLUMN, detect_format, iter_reviews
+from app.sentiment_analyzer import analyze_batch
+from app.stats import SentimentSketch, record_stats
+
+UPLOAD_FORMATS = ('csv', 'txt')
+
+def analyze_upload(file, user_id, column=DEFAULT_TEXT_COLUMN):
+    """
+    Score an uploaded CSV/TXT file chunk by chunk and store the results
+
+    Werkzeug spools large uploads to a temporary file, so the file is read
+    as a stream and never held in memory as a whole. It is read twice: once
+    to count records against UPLOAD_MAX_ROWS, then to score them. Each
+    chunk is scored outside any transaction and then committed on its own,
+    so other writers are only blocked for the short insert. The upload's
+    sketch is updated in the same commit as each chunk's rows and folded
+    into the user's statistics when the batch turns 'done'; until then
+    get_user_stats adds it. On any error the rows and sketch are deleted
+    and the batch is marked 'failed'.
+
+    Args:
+        file (FileStorage): Uploaded file from request.files
+        user_id (int): Owner of the analyses
+        column (str): CSV column holding the review text
+
+    Returns:
+        tuple: (UploadBatch, None) on success or (None, error message)
+    """
+    if not file or not file.filename:
+        return None, 'No file uploaded'
+    try:
+        fmt = detect_format(file.filename)
+    except ValueError as e:
+        return None, str(e)
+    if fmt not in UPLOAD_FORMATS:
+        return None, 'Only CSV and TXT files are supported'
+
+    max_rows = current_app.config['UPLOAD_MAX_ROWS']
+    chunk_size = current_app.config['UPLOAD_CHUNK_SIZE']
+
+    # newline='' splits records the same way as the command-line reader
+    stream = io.TextIOWrapper(file.stream, encoding='utf-8-sig', errors='replace', newline='')
+    try:
+        # Count records first so an oversized file is rejected before anything is scored or stored
+        total_rows = 0
+        for total_rows, _ in iter_reviews(stream, fmt, column):
+            if total_rows > max_rows:
+                return None, f'File exceeds the limit of {max_rows} rows'
+        stream.seek(0)
+    except ValueError as e:
+        return None, str(e)
+
+    batch = UploadBatch(user_id=user_id, filename=file.filename[:255], status='processing',
+                        total_rows=total_rows, analyzed=0, positive=0, negative=0, neutral=0, polarity_sum=0.0)
+    db.session.add(batch)
+    db.session.commit()
+    batch_id = batch.id
+
+    sketch = SentimentSketch()
+    try:
+        records = iter_reviews(stream, fmt, column)
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                break
+
+            # Score before touching the database so no write lock is held meanwhile
+            results = analyze_batch([text for _, text in chunk])
+            chunk_sketch = SentimentSketch().update_many(results)
+            sketch.merge(chunk_sketch)
+
+            db.session.bulk_insert_mappings(Analysis, [
+                {
+                    'user_id': user_id,
+                    'batch_id': batch_id,
+                    'review_text': result['review'],
+                    'sentiment': result['sentiment'],
+                    'polarity': result['polarity']
+                }
+                for result in results
+            ])
+            batch.analyzed += len(results)
+            for result in results:
+                setattr(batch, result['sentiment'], getattr(batch, result['sentiment']) + 1)
+                batch.polarity_sum += result['polarity']
+            record_stats('dataset', f'upload:{batch_id}', chunk_sketch)
+            db.session.commit()
+
+        # Flipping the status and merging into the user scope together means
+        # the upload is never counted twice by get_user_stats
+        batch.status = 'done'
+        record_stats('user', user_id, sketch)
+        db.session.commit()
+        return batch, None
+    except ValueError as e:
+        _discard_upload(batch_id)
+        return None, str(e)
+    except Exception as e:
+        _discard_upload(batch_id)
+        return None, f'Error analyzing upload: {str(e)}'
+
+def _discard_upload(batch_id):
+    """Delete the analyses and sketch of a failed upload and mark it as failed with empty counts"""
+    db.session.rollback()
+    Analysis.query.filter_by(batch_id=batch_id).delete(synchronize_session=False)
+    SentimentStats.query.filter_by(scope='dataset', scope_key=f'upload:{batch_id}')\
+        .delete(synchronize_session=False)
+    UploadBatch.query.filter_by(id=batch_id).update({
+        'status': 'failed',
+        'analyzed': 0,
+        'positive': 0,
+        'negative': 0,
+        'neutral': 0,
+        'polarity_sum': 0.0
+    }, synchronize_session=False)
+    db.session.commit()
@@ -0,0 +1,171 @@
+"""
+Retention and archival command for the Analysis table
+
+Usage:
+    python archive_analyses.py policy set 90                  # global policy
+    python archive_analyses.py policy set 30 --user alice     # per-user policy
+    python archive_analyses.py policy list
+    python archive_analyses.py run --dry-run                  # report only
+    python archive_analyses.py run --target table --pause 0.1
+    python archive_analyses.py vacuum --enable                # one-time switch to incremental vacuum
+"""
+import argparse
+import sys
+
+from app import create_app, db
+from app.auth import get_user_by_username
+from app.models import RetentionPolicy, User
+from app.retention import (ARCHIVE_TARGETS, clear_policy, incremental_vacuum, plan_retention,
+                           run_retention, set_policy, sqlite_space)
+
+def format_bytes(size):
+    """Human-readable byte count"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024 or unit == 'GB':
+            return f'{size:.1f} {unit}' if unit != 'B' else f'{size} B'
+        size /= 1024
+
+def resolve_user(username):
+    """Look up a user id by name, or None for all users"""
+    if username is None:
+        return None
+    user = get_user_by_username(username)
+    if user is None:
+        raise ValueError(f'User not found: {username}')
+    return user.id
+
+def print_plan(plan, show_archived=False):
+    """Print a per-user table of a retention plan"""
+    print(f"{'User':<20} {'Days':>6} {'Cutoff':<17} {'Rows':>10} {'Est. bytes':>12}"
+          + (f" {'Archived':>10}" if show_archived else ''))
+    print('-' * (70 + (11 if show_archived else 0)))
+    for entry in plan:
+        line = (f"{entry['username'][:20]:<20} {entry['max_age_days']:>6} "
+                f"{entry['cutoff'].strftime('%Y-%m-%d %H:%M'):<17} {entry['rows']:>10} "
+                f"{format_bytes(entry['estimated_bytes']):>12}")
+        if show_archived:
+            line += f" {entry['archived']:>10}"
+        print(line)
+    rows = sum(entry['rows'] for entry in plan)
+    estimated = sum(entry['estimated_bytes'] for entry in plan)
+    print(f'\nTotal: {rows} rows, about {format_bytes(estimated)} of table data')
+
+def cmd_policy(args):
+    """List, set or clear retention policies"""
+    if args.action == 'list':
+        policies = RetentionPolicy.query.order_by(RetentionPolicy.user_id).all()
+        if not policies:
+            print('No retention policies set')
+        for policy in policies:
+            name = User.query.filter_by(id=policy.user_id).first().username if policy.user_id else '(global)'
+            print(f'{name:<20} {policy.max_age_days} days')
+        return 0
+
+    user_id = resolve_user(args.user)
+    if args.action == 'set':
+        if args.days is None or args.days < 0:
+            print('[ERROR] policy set needs a non-negative number of days', file=sys.stderr)
+            return 1
+        set_policy(args.days, user_id)
+        print(f"Set retention for {args.user or 'all users'} to {args.days} days")
+    else:
+        clear_policy(user_id)
+        print(f"Cleared retention policy for {args.user or 'all users'}")
+    db.session.commit()
+    return 0
+
+def cmd_run(args):
+    """Archive old analyses, or report what would be archived"""
+    user_id = resolve_user(args.user)
+    space = sqlite_space()
+
+    if args.dry_run:
+        plan = plan_retention(user_id, args.days)
+        if not plan:
+            print('No retention policy applies; nothing to do')
+            return 0
+        print_plan(plan)
+        if space:
+            print(f"Database: {format_bytes(space['total_bytes'])}, "
+                  f"{format_bytes(space['free_bytes'])} already free for vacuum")
+        return 0
+
+    plan = run_retention(user_id, args.days, args.target, args.batch_size, args.archive_dir, args.pause)
+    if not plan:
+        print('No retention policy applies; nothing to do')
+        return 0
+    print_plan(plan, show_archived=True)
+    for entry in plan:
+        if entry['archive']:
+            print(f"Archived {entry['username']} to {entry['archive']}")
+
+    if not args.no_vacuum:
+        report_vacuum(incremental_vacuum())
+    return 0
+
+def cmd_vacuum(args):
+    """Reclaim free pages from the database file"""
+    report_vacuum(incremental_vacuum(args.pages, enable=args.enable))
+    return 0
+
+def report_vacuum(result):
+    """Print the outcome of an incremental vacuum"""
+    if result is None:
+        print('Vacuum skipped: not a SQLite database')
+    elif not result['enabled']:
+        print(f"Incremental vacuum is not enabled; {format_bytes(result['before']['free_bytes'])} is free. "
+              f"Run 'python archive_analyses.py vacuum --enable' once to turn it on")
+    else:
+        print(f"Vacuum reclaimed {format_bytes(result['reclaimed_bytes'])}; "
+              f"database is now {format_bytes(result['after']['total_bytes'])}")
+
+def parse_args(argv=None):
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(description='Retention and archival for stored analyses')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    policy = commands.add_parser('policy', help='Manage retention policies')
+    policy.add_argument('action', choices=['list', 'set', 'clear'])
+    policy.add_argument('days', type=int, nargs='?', help='Maximum age in days (for set)')
+    policy.add_argument('--user', help='Username (default: the global policy)')
+    policy.set_defaults(func=cmd_policy)
+
+    run = commands.add_parser('run', help='Archive analyses older than their retention period')
+    run.add_argument('--dry-run', action='store_true', help='Report rows and bytes without changing anything')
+    run.add_argument('--user', help='Only process this user')
+    run.add_argument('--days', type=int, help='Override every policy with this maximum age')
+    run.add_argument('--target', choices=ARCHIVE_TARGETS, default='file',
+                     help='Archive to gzipped NDJSON files or to the analysis_archive table (default: file)')
+    run.add_argument('--archive-dir', help='Directory for archive files (default: instance/archive)')
+    run.add_argument('--batch-size', type=int, help='Rows moved per transaction')
+    run.add_argument('--pause', type=float, default=0, help='Seconds to wait between batches')
+    run.add_argument('--no-vacuum', action='store_true', help='Skip the incremental vacuum afterwards')
+    run.set_defaults(func=cmd_run)
+
+    vacuum = commands.add_parser('vacuum', help='Return free database pages to the filesystem')
+    vacuum.add_argument('--pages', type=int, help='Maximum pages to free (default: all)')
+    vacuum.add_argument('--enable', action='store_true',
+                        help='Switch to incremental auto_vacuum (runs one full VACUUM)')
+    vacuum.set_defaults(func=cmd_vacuum)
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        if args.days is not None and args.days < 0:
+            parser.error('--days must not be negative')
+        if args.batch_size is not None and args.batch_size < 1:
+            parser.error('--batch-size must be at least 1')
+        if args.pause < 0:
+            parser.error('--pause must not be negative')
+    if args.command == 'vacuum' and args.pages is not None and args.pages < 1:
+        parser.error('--pages must be at least 1')
+    return args
+
+if __name__ == '__main__':
+    args = parse_args()
+    app = create_app()
+    with app.app_context():
+        try:
+            sys.exit(args.func(args))
+        except (OSError, ValueError) as e:
+            print(f'[ERROR] {e}', file=sys.stderr)
+            sys.exit(1)
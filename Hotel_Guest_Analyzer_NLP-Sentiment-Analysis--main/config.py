@@ -16,4 +16,22 @@ class Config:
     database_path = instance_path / 'database.db'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or f'sqlite:///{database_path}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-
+    
+    # File upload analysis; larger request bodies are rejected with 413 before parsing
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_UPLOAD_MB', 16)) * 1024 * 1024
+    UPLOAD_MAX_ROWS = int(os.environ.get('UPLOAD_MAX_ROWS', 50000))
+    UPLOAD_CHUNK_SIZE = 500
+    UPLOAD_PAGE_SIZE = 50
+    
+    # Micro-batching for /api/analyze: concurrent requests arriving within the
+    # window (or until the batch is full) are scored and committed together.
+    # A window of 0 disables batching.
+    ANALYZE_BATCH_WINDOW_MS = float(os.environ.get('ANALYZE_BATCH_WINDOW_MS', 5))
+    ANALYZE_BATCH_MAX_SIZE = int(os.environ.get('ANALYZE_BATCH_MAX_SIZE', 64))
+    ANALYZE_BATCH_TIMEOUT = 30
+    
+    # Retention: analyses older than RETENTION_DAYS are archived unless a
+    # RetentionPolicy row overrides it (unset keeps everything)
+    RETENTION_DAYS = int(os.environ['RETENTION_DAYS']) if os.environ.get('RETENTION_DAYS') else None
+    RETENTION_BATCH_SIZE = 1000
+    ARCHIVE_DIR = instance_path / 'archive'
@@ -0,0 +1,225 @@
+"""
+Offline batch scorer for large review files
+
+Streams reviews from a CSV, NDJSON or plain-text file, scores them across
+all CPU cores and appends results to the output as each chunk finishes.
+A checkpoint next to the output file allows an interrupted run to resume.
+
+Usage:
+    python score_reviews.py data/hotel_reviews_dataset.csv results.csv
+    python score_reviews.py reviews.ndjson results.ndjson --column text --workers 8
+    python score_reviews.py reviews.txt results.csv --resume --stats stats.json
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from app.readers import DEFAULT_TEXT_COLUMN, detect_format, iter_reviews
+from app.sentiment_analyzer import analyze_batch
+from app.stats import SentimentSketch
+
+OUTPUT_FIELDS = ['row', 'sentiment', 'polarity', 'subjectivity', 'review']
+
+def score_chunk(chunk):
+    """
+    Score one chunk of reviews (runs inside a worker process)
+
+    Args:
+        chunk (list): List of (row_number, text) tuples
+
+    Returns:
+        tuple: (results with the source row number attached, SentimentSketch
+        of the chunk to be merged by the parent process)
+    """
+    results = analyze_batch([text for _, text in chunk])
+    for (row_number, _), result in zip(chunk, results):
+        result['row'] = row_number
+    return results, SentimentSketch().update_many(results)
+
+def iter_chunks(records, chunk_size):
+    """Group an iterator of records into lists of chunk_size"""
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def score_in_parallel(chunks, workers):
+    """
+    Score chunks in a process pool, yielding results in input order
+
+    Only a bounded number of chunks is in flight at once, so the input is
+    never read far ahead of the output.
+    """
+    if workers <= 1:
+        for chunk in chunks:
+            yield score_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(score_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def format_results(results, fmt, write_header):
+    """Encode a chunk of results as CSV or NDJSON bytes"""
+    buffer = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.DictWriter(buffer, fieldnames=OUTPUT_FIELDS, extrasaction='ignore')
+        if write_header:
+            writer.writeheader()
+        writer.writerows(results)
+    else:
+        for result in results:
+            buffer.write(json.dumps({field: result[field] for field in OUTPUT_FIELDS}) + '\n')
+    return buffer.getvalue().encode('utf-8')
+
+def load_checkpoint(path):
+    """Load a checkpoint file, or return None if there is none"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_checkpoint(path, checkpoint):
+    """Atomically replace the checkpoint file"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def report_progress(scored, started, final=False):
+    """Print a one-line progress and throughput report to stderr"""
+    elapsed = max(time.time() - started, 1e-9)
+    end = '\n' if final else ''
+    print(f'\rScored {scored} reviews in {elapsed:.1f}s ({scored / elapsed:.0f} reviews/s)',
+          end=end, file=sys.stderr, flush=True)
+
+def run(args):
+    """Score the input file according to parsed command-line arguments"""
+    input_format = args.format or detect_format(args.input)
+    output_format = 'ndjson' if detect_format(args.output) == 'ndjson' else 'csv'
+    checkpoint_path = args.output + '.checkpoint'
+
+    checkpoint = load_checkpoint(checkpoint_path) if args.resume else None
+    if checkpoint:
+        if checkpoint['input'] != os.path.abspath(args.input):
+            print(f"[ERROR] Checkpoint belongs to {checkpoint['input']}", file=sys.stderr)
+            return 1
+        for option, value in (('format', input_format), ('column', args.column)):
+            if checkpoint.get(option) != value:
+                print(f"[ERROR] Checkpoint was made with --{option} {checkpoint.get(option)!r}, "
+                      f"not {value!r}", file=sys.stderr)
+                return 1
+        # Truncating a missing or shorter output would pad it with NUL bytes
+        output_size = os.path.getsize(args.output) if os.path.exists(args.output) else 0
+        if output_size < checkpoint['offset']:
+            print(f"[ERROR] {args.output} is shorter than the checkpoint expects "
+                  f"({output_size} < {checkpoint['offset']} bytes); rerun without --resume to start over",
+                  file=sys.stderr)
+            return 1
+        print(f"Resuming after row {checkpoint['last_row']} "
+              f"({checkpoint['scored']} reviews already scored)", file=sys.stderr)
+    else:
+        # A stale checkpoint must not outlive the output it described
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        checkpoint = {'input': os.path.abspath(args.input), 'format': input_format, 'column': args.column,
+                      'last_row': 0, 'offset': 0, 'scored': 0}
+    stats = SentimentSketch.from_dict(checkpoint['stats']) if 'stats' in checkpoint else SentimentSketch()
+
+    newline = '' if input_format == 'csv' else None
+    # utf-8-sig strips the byte order mark Excel puts in front of the header
+    with open(args.input, 'r', encoding='utf-8-sig', newline=newline) as source, \
+            open(args.output, 'ab') as out:
+        # Drop anything written after the last checkpoint
+        out.truncate(checkpoint['offset'])
+        out.seek(checkpoint['offset'])
+
+        last_row = checkpoint['last_row']
+        records = (record for record in iter_reviews(source, input_format, args.column)
+                   if record[0] > last_row)
+
+        started = time.time()
+        scored_this_run = 0
+        try:
+            for results, chunk_stats in score_in_parallel(iter_chunks(records, args.chunk_size), args.workers):
+                if not results:
+                    continue
+                stats.merge(chunk_stats)
+                out.write(format_results(results, output_format, checkpoint['offset'] == 0))
+                out.flush()
+                os.fsync(out.fileno())
+
+                checkpoint['last_row'] = results[-1]['row']
+                checkpoint['offset'] = out.tell()
+                checkpoint['scored'] += len(results)
+                checkpoint['stats'] = stats.to_dict()
+                save_checkpoint(checkpoint_path, checkpoint)
+
+                scored_this_run += len(results)
+                if not args.quiet:
+                    report_progress(scored_this_run, started)
+        except KeyboardInterrupt:
+            print(f"\nInterrupted after row {checkpoint['last_row']}; "
+                  f"rerun with --resume to continue", file=sys.stderr)
+            return 130
+
+    if not args.quiet:
+        report_progress(scored_this_run, started, final=True)
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    print(f"Wrote {checkpoint['scored']} results to {args.output}", file=sys.stderr)
+
+    summary = stats.summary()
+    if not args.quiet and summary['count']:
+        polarity = summary['polarity']
+        percentiles = ', '.join(f'{name}={value}' for name, value in polarity['percentiles'].items())
+        print(f"Polarity mean {polarity['mean']} (std {polarity['std']}); {percentiles}", file=sys.stderr)
+    if args.stats:
+        with open(args.stats, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+def parse_args(argv=None):
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(description='Score hotel reviews from a file using all CPU cores')
+    parser.add_argument('input', help='Input file (.csv, .ndjson/.jsonl or .txt)')
+    parser.add_argument('output', help='Output file (.csv or .ndjson/.jsonl)')
+    parser.add_argument('--format', choices=['csv', 'ndjson', 'txt'],
+                        help='Input format (default: detected from the file extension)')
+    parser.add_argument('--column', default=DEFAULT_TEXT_COLUMN,
+                        help=f"Field holding the review text (default: '{DEFAULT_TEXT_COLUMN}')")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Number of worker processes (default: all cores)')
+    parser.add_argument('--chunk-size', type=int, default=500,
+                        help='Reviews per work unit and per checkpoint (default: 500)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue from the checkpoint left by an interrupted run')
+    parser.add_argument('--stats', help='Write polarity/subjectivity statistics as JSON to this file')
+    parser.add_argument('--quiet', action='store_true', help='Suppress progress output')
+    args = parser.parse_args(argv)
+    if args.workers < 1 or args.chunk_size < 1:
+        parser.error('--workers and --chunk-size must be at least 1')
+    return args
+
+if __name__ == '__main__':
+    try:
+        sys.exit(run(parse_args()))
+    except (OSError, ValueError) as e:
+        print(f'[ERROR] {e}', file=sys.stderr)
+        sys.exit(1)